@@ -2,19 +2,25 @@
 
 from __future__ import annotations
 
+import contextlib
+import copy
 import datetime as dt
+import functools
+import hashlib
 import io
+import mmap
 import os
 import re
+import shlex
 import sqlite3
 import sys
 import typing
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from shutil import rmtree
 from typing import Optional
 
 import edwh
@@ -26,19 +32,21 @@ from invoke import Context, task
 
 from .css import extract_contents_for_css
 from .js import extract_contents_for_js
-from .shared import truthy
+from .shared import MAX_PARALLEL_FILES, prefetch_cdn, truthy
+
+try:
+    # libyaml-backed loader is a lot faster for big bundle configs
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader as _YamlLoader
 
 
 def now():
     """
     Backwards and forwards compatible way to get the current datetime in UTC.
     """
-    try:
-        # 3.12
-        return datetime.now(dt.UTC)
-    except AttributeError:
-        # 3.10
-        return datetime.utcnow()
+    # dt.UTC is 3.11+ and utcnow is deprecated in 3.12, timezone.utc works everywhere:
+    return datetime.now(dt.timezone.utc)
 
 
 # prgram is created in __init__
@@ -51,11 +59,13 @@ DEFAULT_OUTPUT_CSS = "bundle.css"
 
 TMP = Path("/tmp")
 
-TEMP_OUTPUT_DIR = TMP / "bundle-build"
 TEMP_OUTPUT = ".bundle_tmp"
 DEFAULT_ASSETS_DB = TMP / "lts_assets.db"
 DEFAULT_ASSETS_SQL = "py4web/apps/lts/databases/lts_assets.sql"
 
+# (absolute path, mtime, size, loader args) -> parsed config
+_CONFIG_CACHE: dict[tuple, dict] = {}
+
 
 def convert_data(data: dict[str, typing.Any] | list[typing.Any] | typing.Any):
     """
@@ -70,13 +80,35 @@ def convert_data(data: dict[str, typing.Any] | list[typing.Any] | typing.Any):
         return data
 
 
+def _cache_config(loader: typing.Callable[..., dict]) -> typing.Callable[..., dict]:
+    """
+    Parse each config file only once (per modification), since build, build_js, build_css and publish
+    all load the same config.
+    """
+
+    @functools.wraps(loader)
+    def wrapper(fname: str, *args, **kwargs) -> dict:
+        stat = os.stat(fname)
+        key = (os.path.abspath(fname), stat.st_mtime_ns, stat.st_size, loader.__name__, args, tuple(kwargs.items()))
+        if key not in _CONFIG_CACHE:
+            _CONFIG_CACHE[key] = loader(fname, *args, **kwargs)
+
+        # callers modify their settings (e.g. 'version'), so never hand out the cached dict itself:
+        return copy.deepcopy(_CONFIG_CACHE[key])
+
+    return wrapper
+
+
+@_cache_config
 def _load_config_yaml(fname: str):
-    with open(fname) as f:
-        data = yaml.load(f, yaml.SafeLoader)
+    # binary mode: libyaml decodes the bytes itself
+    with open(fname, "rb") as f:
+        data = yaml.load(f, _YamlLoader)
 
     return convert_data(data)
 
 
+@_cache_config
 def _load_config_toml(fname: str, key: str = ""):
     with open(fname) as f:
         data = tomlkit.load(f)
@@ -97,20 +129,26 @@ def _load_config_pyproject():
     return "pyproject.toml", data
 
 
+# file extension -> parser, so the file name only has to be checked (and stat'ed) once
+_CONFIG_LOADERS: dict[str, typing.Callable[[str], dict]] = {
+    ".yml": _load_config_yaml,
+    ".yaml": _load_config_yaml,
+    ".toml": _load_config_toml,
+}
+
+
 def _load_config(fname: str = DEFAULT_INPUT, strict=False) -> tuple[str, dict]:
     """
     Load yaml config from file name, default to empty or error if strict
     """
-    if os.path.exists(fname) and fname.endswith((".yml", ".yaml")):
-        # load default or user-defined yaml
-        return fname, _load_config_yaml(fname)
-    elif os.path.exists(fname) and fname.endswith(".toml"):
-        # load user defined toml
-        if fname == "pyproject.toml":
-            return _load_config_pyproject()
-        else:
-            return fname, _load_config_toml(fname)
-    elif fname == DEFAULT_INPUT and (altname := DEFAULT_INPUT.replace(".yaml", ".toml")) and os.path.exists(altname):
+    if fname == "pyproject.toml" and os.path.exists(fname):
+        return _load_config_pyproject()
+    elif loader := _CONFIG_LOADERS.get(os.path.splitext(fname)[1]):
+        # load default or user-defined yaml/toml, the loader's (cached) stat doubles as the exists check:
+        with contextlib.suppress(FileNotFoundError):
+            return fname, loader(fname)
+
+    if fname == DEFAULT_INPUT and (altname := DEFAULT_INPUT.replace(".yaml", ".toml")) and os.path.exists(altname):
         # try bundle.toml
         return altname, _load_config_toml(altname)
     elif os.path.exists("pyproject.toml"):
@@ -145,7 +183,7 @@ def load_config(fname: str = DEFAULT_INPUT, strict=True, verbose=False) -> dict[
 @contextmanager
 def start_buffer(temp: str | typing.IO = TEMP_OUTPUT) -> typing.IO:
     """
-    Open a temp buffer file in append mode and first remove old version if that exists
+    Open a temp buffer file (binary, with a large write buffer), truncating an old version if that exists
     """
     if isinstance(temp, io.IOBase):
         # already writable like io.StringIO or sys.stdout
@@ -154,17 +192,12 @@ def start_buffer(temp: str | typing.IO = TEMP_OUTPUT) -> typing.IO:
 
     path = Path(temp)
 
-    if path.exists():
-        path.unlink()
-
     # ensure the path to the file exists:
     path.parent.mkdir(parents=True, exist_ok=True)
 
-    f = path.open("a")
-    try:
+    # 'w' truncates, so no need to remove the old file first
+    with path.open("wb", buffering=1 << 20) as f:
         yield f
-    finally:
-        f.close()
 
 
 def cli_or_config(
@@ -189,8 +222,12 @@ def cli_or_config(
     return (truthy(value) if is_bool else value) if value is not None else config.get(key, default)
 
 
+# compiled /$(key1|key2|...)/ pattern + {key: replacement}
+Variables = tuple[typing.Optional[re.Pattern], dict[str, typing.Any]]
+
+
 @typing.overload
-def _fill_variables(setting: str, variables: dict[re.Pattern, str]) -> str:
+def _fill_variables(setting: str, variables: Variables) -> str:
     """
     If a string is passed as setting, the $variables in the string are filled.
     E.g. "$in_app/path/to/css" + {'in_app': 'apps/cmsx'} -> 'apps/cmsx/path/to/css'
@@ -198,13 +235,13 @@ def _fill_variables(setting: str, variables: dict[re.Pattern, str]) -> str:
 
 
 @typing.overload
-def _fill_variables(setting: dict, variables: dict[re.Pattern, str]) -> dict[str, str]:
+def _fill_variables(setting: dict, variables: Variables) -> dict[str, str]:
     """
     If a dict of settings is passed, all values are filled. Keys are left alone.
     """
 
 
-def _fill_variables(setting: str | dict, variables: dict[re.Pattern, str]) -> str | dict[str, str]:
+def _fill_variables(setting: str | dict, variables: Variables) -> str | dict[str, str]:
     """
     Fill in $variables in a dynamic setting.
     E.g. "$in_app/path/to/css" + {'in_app': 'apps/cmsx'} -> 'apps/cmsx/path/to/css'
@@ -213,32 +250,59 @@ def _fill_variables(setting: str | dict, variables: dict[re.Pattern, str]) -> st
         # recursive fill nested values:
         return {k: _fill_variables(v, variables) for k, v in setting.items()}
 
-    if "$" not in str(setting):
+    pattern, replacements = variables
+    if pattern is None or not isinstance(setting, str) or "$" not in setting:
+        # nothing to fill (e.g. bool/int settings or an IO output)
         return setting
 
-    for reg, repl in variables.items():
-        setting = reg.sub(str(repl), str(setting))
+    if setting[0] == "$" and setting[1:] in replacements:
+        # the whole setting is one variable (e.g. output: $file), plain dict lookup:
+        return str(replacements[setting[1:]])
+
+    # one scan over the string for all variables, only the matched replacements are stringified:
+    return pattern.sub(lambda match: str(replacements[match.group(1)]), setting)
 
-    return setting
 
+@functools.lru_cache
+def _variables_pattern(keys: tuple[str, ...]) -> re.Pattern:
+    """
+    Build one /$(key1|key2|...)/ alternation for all keys.
+    Longest keys go first so e.g. $filename is not replaced by $file + 'name'.
+    """
+    alternatives = "|".join(re.escape(key) for key in sorted(keys, key=len, reverse=True))
+    return re.compile(rf"\$({alternatives})")
 
-def _regexify_settings(setting_dict: dict[str, typing.Any]) -> dict[re.Pattern, typing.Any]:
+
+def _regexify_settings(setting_dict: dict[str, typing.Any]) -> Variables:
     """
-    Convert a dict keys from string to a compiled regex pattern (/$string/)
+    Convert a dict of settings to a compiled regex pattern (/$key/) and a lookup of the replacements
     """
-    return {re.compile(rf"\${key}"): value for key, value in setting_dict.items()}
+    if not setting_dict:
+        return None, {}
+
+    return _variables_pattern(tuple(setting_dict)), setting_dict
 
 
 def store_file_hash(input_filename: str, output_filename: str = None):
     if output_filename is None:
         output_filename = f"{input_filename}.hash"
-    c = Context()
-    file_hash = calculate_file_hash(c, input_filename)
+    file_hash = calculate_file_hash(input_filename)
     with open(output_filename, "w") as f:
         f.write(file_hash)
     return output_filename
 
 
+@dataclass
+class Bundle:
+    """
+    Bundle for a sqlite:// output, which is kept in memory until it is published.
+    """
+
+    filename: str
+    contents: str
+    hash: str  # sha1 of the utf-8 encoded contents
+
+
 class FileHandler(typing.Protocol):
     # bijv. extract_contents_for_js, extract_contents_for_css
     def __call__(
@@ -262,7 +326,7 @@ def _handle_files(
     Args:
         files: list of files from the 'css' or 'js' section in the config yaml
         callback: method to execute to gather and process file contents
-        output: final output file path to write to
+        output: final output file path to write to (or sqlite://filename to keep it in memory for `publish`)
         verbose: logs some info to stderr
         use_cache: use cache for online resources?
         minify: minify file contents?
@@ -288,35 +352,58 @@ def _handle_files(
             print("No files supplied, quitting", file=sys.stderr)
         return
 
-    # if output starts with sqlite:// write to tmp and save to db later
-    if output.startswith("sqlite://"):
-        # database_path = output.split("sqlite://", 1)[1]
-        output_filename = output.split("/")[-1]
-        ts = datetime.now()
-        ts = str(ts).replace(" ", "_")
+    # empty - skip
+    files = [inf for inf in files if inf]
 
-        output_dir = TEMP_OUTPUT_DIR / ts
-        output_dir.mkdir(parents=True, exist_ok=True)
-        output = output_dir / output_filename
+    if use_cache:
+        # download remote files side by side first, handling them below then only hits the cache:
+        prefetch_cdn(inf.get("file", "") if isinstance(inf, dict) else str(inf) for inf in files)
 
-    with start_buffer(output) as bufferf:
-        for inf in files:
-            if not inf:
-                # empty - skip
-                continue
+    def handle(inf: dict | str) -> str:
+        return callback(inf, settings, cache=use_cache, minify=minify, verbose=verbose)
 
-            if not minify:
-                src = str(inf).replace("/*", "//").replace("*/", "")
-                bufferf.write(f"/* SOURCE: {src} */\n")
+    if truthy(os.environ.get("EDWH_BUNDLE_PARALLEL", "0")) and len(files) > 1:
+        # fetch/minify files concurrently (mostly waiting on network or disk), results keep their order.
+        # typescript tracks included dependencies in `settings`, so those are still handled one by one:
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_FILES, len(files))) as executor:
+            futures = [None if str(inf).endswith(".ts") else executor.submit(handle, inf) for inf in files]
+            results = [future.result() if future else handle(inf) for inf, future in zip(files, futures)]
+    else:
+        results = map(handle, files)
 
-            res = callback(inf, settings, cache=use_cache, minify=minify, verbose=verbose)
+    chunks = []
+    for inf, res in zip(files, results):
+        if not minify:
+            src = str(inf).replace("/*", "//").replace("*/", "")
+            chunks.append(f"/* SOURCE: {src} */\n")
 
-            bufferf.write(res + "\n")
-            if verbose:
-                print(f"Handled {inf}", file=sys.stderr)
+        chunks.append(res)
+        chunks.append("\n")
+        if verbose:
+            print(f"Handled {inf}", file=sys.stderr)
+
+    # if output starts with sqlite:// keep the bundle in memory and save to db later (via `publish`)
+    if isinstance(output, str) and output.startswith("sqlite://"):
+        # database_path = output.split("sqlite://", 1)[1]
+        output_filename = os.path.basename(output)
+        contents = "".join(chunks)
+
+        bundle = Bundle(
+            filename=output_filename,
+            contents=contents,
+            hash=hashlib.sha1(contents.encode("UTF-8")).hexdigest(),
+        )
+        print(output)
+        return bundle
+
+    with start_buffer(output) as bufferf:
+        # write the whole bundle at once instead of many small writes
+        if isinstance(bufferf, io.TextIOBase):
+            # e.g. io.StringIO or sys.stdout
+            bufferf.writelines(chunks)
+        else:
+            bufferf.writelines(chunk.encode("UTF-8") for chunk in chunks)
 
-    if not isinstance(output, io.IOBase):
-        os.rename(bufferf.name, output)
     if verbose:
         print(f"Written final bundle to {output}", file=sys.stderr)
 
@@ -553,9 +640,10 @@ def build(
     save_hash: bool = None,
     version: str = None,
     name: Optional[str] = None,
+    sequential: bool = False,
 ):
     """
-    Build the JS and CSS bundle
+    Build the JS and CSS bundle (at the same time, unless --sequential is passed)
     """
 
     configs = load_config(config, verbose=True)
@@ -572,17 +660,17 @@ def build(
         do_use_cache = cli_or_config(use_cache, settings, "cache", default=True)
         do_save_hash = cli_or_config(save_hash, settings, "hash")
 
-        # second argument of build_ is None, so files will be loaded from config.
-        # --files can be supplied for the build-js or build-css methods, but not for normal build
-        # since it would be too ambiguous to determine whether the files should be compiled as JS or CSS.
-        try:
-            result.append(
-                build_js(
+        def build_one(builder: typing.Callable[..., dict], output: Optional[str]) -> Optional[dict]:
+            # second argument of build_ is None, so files will be loaded from config.
+            # --files can be supplied for the build-js or build-css methods, but not for normal build
+            # since it would be too ambiguous to determine whether the files should be compiled as JS or CSS.
+            try:
+                return builder(
                     c,
                     None,
                     config,
                     verbose,
-                    output_js,
+                    output,
                     do_minify,
                     do_use_cache,
                     do_save_hash,
@@ -590,28 +678,20 @@ def build(
                     stdout=False,
                     name=config_name,
                 )
-            )
-        except NotFound as e:
-            warnings.warn(str(e), source=e)
+            except NotFound as e:
+                warnings.warn(str(e), source=e)
+                return None
 
-        try:
-            result.append(
-                build_css(
-                    c,
-                    None,
-                    config,
-                    verbose,
-                    output_css,
-                    do_minify,
-                    do_use_cache,
-                    do_save_hash,
-                    version,
-                    stdout=False,
-                    name=config_name,
-                ),
-            )
-        except NotFound as e:
-            warnings.warn(str(e), source=e)
+        jobs = [(build_js, output_js), (build_css, output_css)]
+        if sequential:
+            outputs = [build_one(*job) for job in jobs]
+        else:
+            # js and css are independent (and mostly waiting on disk/network), so build them side by side:
+            with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+                outputs = list(executor.map(lambda job: build_one(*job), jobs))
+
+        # js first, then css (like before), missing ones are skipped:
+        result.extend(output for output in outputs if output is not None)
 
     return result
 
@@ -634,23 +714,26 @@ def dict_factory(cursor: sqlite3.Cursor, row: sqlite3.Row):
     return {col[0]: row[idx] for idx, col in enumerate(cursor.description)}
 
 
-def assert_chmod_777(c: Context, filepath: str | list[str]):
-    filepaths: list[str] = [filepath] if isinstance(filepath, str) else filepath
+def assert_chmod_777(c: Context, filepath: str | Path | list[str | Path]):
+    filepaths: list[str | Path] = [filepath] if isinstance(filepath, (str, Path)) else filepath
 
-    # filepaths with incorrect chmod are collected,
-    #  so require_sudo only has to be executed if any chmod has to happen
+    # files that can't be chmodded by the current user are collected,
+    #  so require_sudo only has to be executed if any chmod has to happen via sudo
     #  skipping annoying sudo prompts when sudo is not actually used
     todos = []
     for fp in filepaths:
-        resp = c.run(f'stat --format "%a  %n" {fp}', hide=True)
-        chmod = resp.stdout.split(" ")[0]
-        if chmod != "777":
+        if os.stat(fp).st_mode & 0o777 == 0o777:
+            continue
+
+        try:
+            os.chmod(fp, 0o777)
+        except PermissionError:
             todos.append(fp)
 
     if todos:
         edwh.tasks.require_sudo(c)  # can't chmod without sudo
     for todo in todos:
-        c.sudo(f"chmod 777 {todo}")
+        c.sudo(f"chmod 777 {shlex.quote(str(todo))}")
 
 
 def create_bundle_version_table():
@@ -672,6 +755,15 @@ def create_bundle_version_table():
     return sql
 
 
+def create_bundle_version_indexes():
+    # for existing_filetypes, version_exists and prompt_changelog (filetype, version) and get_latest_version (semver)
+    sql = """
+    CREATE INDEX IF NOT EXISTS idx_bundle_type ON bundle_version(filetype, version);
+    CREATE INDEX IF NOT EXISTS idx_bundle_semver ON bundle_version(filetype, major DESC, minor DESC, patch DESC);
+    """
+    return sql
+
+
 def assert_file_exists(c: Context, db_file: str, sql_file: str):
     db_filepath = Path(db_file)
     sql_filepath = Path(sql_file)
@@ -693,7 +785,7 @@ def assert_file_exists(c: Context, db_file: str, sql_file: str):
         sql_filepath.touch()
     elif not db_filepath.exists():
         # load existing
-        c.run(f"sqlite3 {db_filepath} < {sql_filepath}")
+        c.run(f"sqlite3 {shlex.quote(str(db_filepath))} < {shlex.quote(str(sql_filepath))}")
 
 
 def config_setting(key, default=None, config=None, config_path=None, config_name="_"):
@@ -708,59 +800,109 @@ def config_setting(key, default=None, config=None, config_path=None, config_name
     return _fill_variables(var, re_settings)
 
 
-def setup_db(c: invoke.context.Context, config_path=DEFAULT_INPUT_LTS) -> sqlite3.Connection:
+SQLITE_PRAGMAS = """
+PRAGMA synchronous = NORMAL;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -64000;
+PRAGMA mmap_size = 268435456;
+"""
+
+
+class BundleDatabase(sqlite3.Connection):
+    """
+    Connection to the versions database, which also remembers where its sql dump lives.
+    """
+
+    sql_path: str
+
+
+def setup_db(c: invoke.context.Context, config_path=DEFAULT_INPUT_LTS) -> BundleDatabase:
     """
     note: this does NOT work with multiple configurations in one yaml yet!!
     """
-    db_path = config_setting("output_db", DEFAULT_ASSETS_DB, config_path=config_path)
-    sql_path = config_setting("output_sql", DEFAULT_ASSETS_SQL, config_path=config_path)
+    config = load_config(config_path)
+    db_path = config_setting("output_db", DEFAULT_ASSETS_DB, config=config)
+    sql_path = config_setting("output_sql", DEFAULT_ASSETS_SQL, config=config)
 
     assert_file_exists(c, db_path, sql_path)
     assert_chmod_777(c, [db_path, sql_path])
-    con = sqlite3.connect(db_path)
+    con = sqlite3.connect(db_path, factory=BundleDatabase)
+    # so _update_assets_sql doesn't have to load the config again:
+    con.sql_path = sql_path
+    # single writer, so WAL + NORMAL sync is safe and saves an fsync per commit.
+    # journal_mode is stored in the db file itself, so it only has to be switched once:
+    if con.execute("PRAGMA journal_mode;").fetchone()[0] != "wal":
+        con.execute("PRAGMA journal_mode = WAL;")
+    # the others are per connection:
+    con.executescript(SQLITE_PRAGMAS)
+    con.executescript(create_bundle_version_indexes())
     con.row_factory = dict_factory
     return con
 
 
-def get_latest_version(db: sqlite3.Connection, filetype: str = None) -> dict:
-    query = ["SELECT *", "FROM bundle_version"]
+# note: `contents` holds a whole bundle, so don't select it when it's not needed
+BUNDLE_VERSION_COLUMNS = "id, filetype, version, filename, major, minor, patch, hash, created_at"
+
+SELECT_LATEST_VERSION_SQL = f"""
+SELECT {BUNDLE_VERSION_COLUMNS} FROM bundle_version ORDER BY major DESC, minor DESC, patch DESC LIMIT 1;
+"""
+SELECT_LATEST_VERSION_BY_TYPE_SQL = f"""
+SELECT {BUNDLE_VERSION_COLUMNS} FROM bundle_version
+WHERE filetype = ? ORDER BY major DESC, minor DESC, patch DESC LIMIT 1;
+"""
 
-    if filetype:
-        query.append(f"WHERE filetype = '{filetype}'")
 
-    query.append("ORDER BY major DESC, minor DESC, patch DESC")
+def get_latest_version(db: sqlite3.Connection, filetype: str = None) -> dict:
+    if filetype:
+        cur = db.execute(SELECT_LATEST_VERSION_BY_TYPE_SQL, (filetype,))
+    else:
+        cur = db.execute(SELECT_LATEST_VERSION_SQL)
 
-    cur = db.execute(" ".join(query))
     return cur.fetchone() or {}
 
 
-def _update_assets_sql(c: invoke.context.Context, config: str = None):
+def _update_assets_sql(db: BundleDatabase):
     """
-    ... todo docs ...
+    Write a SQL dump of the versions database to `output_sql`, so it can be committed and used to rebuild the db.
     Should be done after each db.commit()
     """
-    # for line in db.iterdump():
-    db_path = config_setting("output_db", DEFAULT_ASSETS_DB, config_path=config)
-    sql_path = config_setting("output_sql", DEFAULT_ASSETS_SQL, config_path=config)
-
-    c.run(f"sqlite3 {db_path} .dump > {sql_path}", hide=True)
+    # iterdump unpacks plain tuples, so dict_factory can't be used while dumping:
+    row_factory, db.row_factory = db.row_factory, None
+    try:
+        with open(db.sql_path, "w", encoding="UTF-8", buffering=1 << 20) as f:
+            f.writelines(f"{line}\n" for line in db.iterdump())
+    finally:
+        db.row_factory = row_factory
 
 
 @task()
-def update_assets_sql(c, config: str = None):
-    # db = setup_db(c)
-    _update_assets_sql(c, config)
+def update_assets_sql(c, config: str = DEFAULT_INPUT_LTS):
+    db = setup_db(c, config)
+    _update_assets_sql(db)
 
 
-def insert_version(c: invoke.context.Context, db: sqlite3.Connection, values: dict, config: str = None):
-    columns = ", ".join(values.keys())
-    placeholders = ":" + ", :".join(values.keys())
+INSERT_BUNDLE_VERSION_SQL = """
+INSERT INTO bundle_version (filetype, version, filename, major, minor, patch, hash, created_at, changelog, contents)
+VALUES (:filetype, :version, :filename, :major, :minor, :patch, :hash, :created_at, :changelog, :contents);
+"""
 
-    query = "INSERT INTO bundle_version ({}) VALUES ({})"
 
-    db.execute(query.format(columns, placeholders), values)
-    db.commit()
-    _update_assets_sql(c, config)
+def insert_versions(db: BundleDatabase, rows: list[dict]):
+    """
+    Insert multiple bundle versions in one transaction and only update the sql dump once afterwards.
+    """
+    if not rows:
+        return
+
+    with db:
+        # commits on success, rolls back on error
+        db.executemany(INSERT_BUNDLE_VERSION_SQL, rows)
+
+    _update_assets_sql(db)
+
+
+def insert_version(db: BundleDatabase, values: dict):
+    insert_versions(db, [values])
 
 
 def version_exists(db: sqlite3.Connection, filetype: str, version: str):
@@ -769,6 +911,19 @@ def version_exists(db: sqlite3.Connection, filetype: str, version: str):
     return db.execute(query, (filetype, version)).fetchone()["c"] > 0
 
 
+def existing_filetypes(
+    db: sqlite3.Connection, version: str, filetypes: typing.Sequence[str] = ("js", "css")
+) -> set[str]:
+    """
+    Which `filetypes` already have `version`, in one query instead of a `version_exists` per filetype.
+    """
+    # filetype is the leading column of idx_bundle_type, so it has to be in the where for the index to be used:
+    placeholders = ", ".join("?" * len(filetypes))
+    query = f"SELECT DISTINCT filetype FROM bundle_version WHERE filetype IN ({placeholders}) AND version = ?;"
+
+    return {row["filetype"] for row in db.execute(query, (*filetypes, version))}
+
+
 def prompt_changelog(db: sqlite3.Connection, filename: str, filetype: str, version: str):
     load_dotenv()
 
@@ -799,6 +954,10 @@ def confirm(prompt: str, force=False) -> bool:
     return force or truthy(input(prompt))
 
 
+# major(.minor)(.patch)
+VERSION_RE = re.compile(r"(\d{1,3})(?:\.(\d{1,3}))?(?:\.(\d{1,3}))?")
+
+
 def _decide_new_version(major: int, minor: int, patch: int, previous: dict, version: str):
     if not any((version, major, minor, patch)):
         print("Previous version is:", previous.get("version", "0.0.0"))
@@ -818,20 +977,46 @@ def _decide_new_version(major: int, minor: int, patch: int, previous: dict, vers
         minor = previous.get("minor", 0)
         new_patch = previous.get("patch", 0) + 1
         version = f"{major}.{minor}.{new_patch}"
-    version_re = re.compile(r"^(\d{1,3})(\.\d{1,3})?(\.\d{1,3})?$")
-    if not (groups := version_re.findall(version)):
+    if not (match := VERSION_RE.fullmatch(version)):
         raise ValueError(f"Invalid version {version}. Please use the format major.major.patch (e.g. 3.5.0)")
-    major, minor, patch = (
-        int(groups[0][0]),
-        int(groups[0][1].strip(".") or 0),
-        int(groups[0][2].strip(".") or 0),
-    )
+    major, minor, patch = (int(group or 0) for group in match.groups())
     version = f"{major}.{minor}.{patch}"
     return major, minor, patch, version
 
 
-def calculate_file_hash(c: Context, filename: str | Path):
-    return c.run(f"sha1sum {filename}", hide=True).stdout.split(" ")[0]
+@contextmanager
+def _mmap_file(filename: str | Path) -> typing.Generator[bytes | mmap.mmap, None, None]:
+    """
+    Read-only view of a file's bytes, without copying it into memory first.
+    """
+    with open(filename, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            # empty files can't be mmapped
+            yield b""
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def load_bundle(filename: str | Path) -> Bundle:
+    """
+    Load a bundle file from disk, hashing the mmapped bytes instead of running `sha1sum` and reading the file again.
+    """
+    with _mmap_file(filename) as data:
+        return Bundle(
+            filename=Path(filename).name,
+            contents=str(data, "UTF-8"),
+            hash=hashlib.sha1(data).hexdigest(),
+        )
+
+
+def calculate_file_hash(filename: str | Path) -> str:
+    """
+    sha1 of a file (same as `sha1sum`), calculated in-process instead of via a subprocess.
+    """
+    with _mmap_file(filename) as data:
+        return hashlib.sha1(data).hexdigest()
 
 
 @task()
@@ -854,37 +1039,37 @@ def publish(
     db = setup_db(c, config)
     previous = get_latest_version(db, "js")
 
-    TEMP_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
     major, minor, patch, version = _decide_new_version(major, minor, patch, previous, version)
 
-    if js and version_exists(db, "js", version):
+    # ask everything up front, so the builds don't have to wait for input:
+    existing = existing_filetypes(db, version)
+    if js and "js" in existing:
         print(f"JS Version {version} already exists!")
         js = confirm("Are you sure you want to overwrite it? ", force)
 
-    if css and version_exists(db, "css", version):
+    if css and "css" in existing:
         print(f"CSS Version {version} already exists!")
         css = confirm("Are you sure you want to overwrite it? ", force)
 
-    output_js = {}
-    if js:
-        output_js = build_js(c, config=config, version=version, verbose=verbose)
+    # js and css are independent (and mostly waiting on disk/network), so build them side by side:
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        future_js = executor.submit(build_js, c, config=config, version=version, verbose=verbose) if js else None
+        future_css = executor.submit(build_css, c, config=config, version=version, verbose=verbose) if css else None
 
-    output_css = {}
-    if css:
-        output_css = build_css(c, config=config, version=version, verbose=verbose)
+        output_js = future_js.result() if future_js else {}
+        output_css = future_css.result() if future_css else {}
 
+    # js and css versions are inserted in one go, so the sql dump only has to be updated once
+    rows = []
     for key, js_file in output_js.items():
         if isinstance(js_file, tuple):
             # (file, hash)
             js_file = js_file[0]
 
-        go, file_hash, filename, file_contents = _should_publish(c, force, js_file, previous.get("hash"), "JS")
+        go, file_hash, filename, file_contents = _should_publish(force, js_file, previous.get("hash"), "JS")
 
         if go:
-            insert_version(
-                c,
-                db,
+            rows.append(
                 {
                     "filetype": "js",
                     "version": version,
@@ -896,24 +1081,19 @@ def publish(
                     "created_at": now(),
                     "changelog": "",
                     "contents": file_contents,
-                },
-                config=config,
+                }
             )
-            print(f"{filename} (JS) version {version} published.")
-            prompt_changelog(db, filename, "js", version)
 
+    previous_css = get_latest_version(db, "css")
     for key, css_file in output_css.items():
         if isinstance(css_file, tuple):
             # (file, hash)
             css_file = css_file[0]
 
-        previous_css = get_latest_version(db, "css")
-        go, file_hash, filename, file_contents = _should_publish(c, force, css_file, previous_css.get("hash"), "CSS")
+        go, file_hash, filename, file_contents = _should_publish(force, css_file, previous_css.get("hash"), "CSS")
 
         if go:
-            insert_version(
-                c,
-                db,
+            rows.append(
                 {
                     "filetype": "css",
                     "version": version,
@@ -925,22 +1105,26 @@ def publish(
                     "created_at": now(),
                     "changelog": "",
                     "contents": file_contents,
-                },
-                config=config,
+                }
             )
-            print(f"{filename} (CSS) version {version} published.")
-            prompt_changelog(db, filename, "css", version)
 
-    rmtree(TEMP_OUTPUT_DIR)
+    insert_versions(db, rows)
+
+    for row in rows:
+        print(f"{row['filename']} ({row['filetype'].upper()}) version {version} published.")
+        prompt_changelog(db, row["filename"], row["filetype"], version)
 
 
 def _should_publish(
-    c: Context, force: bool, output_filename: str | Path, previous_hash: str, filetype: typing.Literal["JS", "CSS"]
+    force: bool,
+    output: Bundle | str | Path,
+    previous_hash: str,
+    filetype: typing.Literal["JS", "CSS"],
 ):
-    output_path = Path(output_filename)
+    # sqlite:// output is already a Bundle, files are read (and hashed) in one pass:
+    bundle = output if isinstance(output, Bundle) else load_bundle(output)
 
-    file_hash = calculate_file_hash(c, output_path)
-    if file_hash == previous_hash:
+    if bundle.hash == previous_hash:
         print(f"{filetype} hash matches previous version.")
         go = confirm("Are you sure you want to release a new version? [yN] ", force)
     else:
@@ -948,10 +1132,10 @@ def _should_publish(
     if not go:
         return False, None, None, None
 
-    # if go:
-    file_contents = output_path.read_text(encoding="UTF-8")
+    return True, bundle.hash, bundle.filename, bundle.contents
+
 
-    return True, file_hash, output_path.name, file_contents
+LIST_VERSIONS_SQL = "SELECT filetype, version FROM bundle_version ORDER BY major DESC, minor DESC, patch DESC;"
 
 
 @task(name="list")
@@ -960,9 +1144,8 @@ def list_versions(c, config=DEFAULT_INPUT_LTS):
     note: this does NOT work with multiple configurations in one yaml yet!!
     """
     db = setup_db(c, config)
-    for row in db.execute(
-        "SELECT filetype, version FROM bundle_version ORDER BY major DESC, minor DESC, patch DESC"
-    ).fetchall():
+    # iterate the cursor itself, no need to fetch all rows into a list first
+    for row in db.execute(LIST_VERSIONS_SQL):
         print(row)
 
 
@@ -981,6 +1164,6 @@ def reset(c, config=DEFAULT_INPUT_LTS):
     # ^ that's the whole point of 'reset'.
     db.execute("DELETE FROM bundle_version;")
     db.commit()
-    _update_assets_sql(c, config)
+    _update_assets_sql(db)
 
     assert db.execute("SELECT COUNT(*) AS c FROM bundle_version;").fetchone()["c"] == 0
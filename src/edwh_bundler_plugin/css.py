@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import contextlib
+import functools
 import os
 import re
 import sys
@@ -14,7 +15,14 @@ from configuraptor import load_data
 from dotenv import load_dotenv
 from termcolor import cprint
 
-from .shared import _del_whitespace, extract_contents_cdn, extract_contents_local
+from . import dart_sass
+from .shared import (
+    _del_whitespace,
+    disk_cache,
+    extract_contents_cdn,
+    extract_contents_local,
+    file_extension,
+)
 
 SCSS_TYPES = None | bool | int | float | str | list["SCSS_TYPES"] | dict[str, "SCSS_TYPES"]
 
@@ -31,8 +39,24 @@ def as_warning(exception_type: typing.Type[Exception]):
         warnings.warn_explicit(str(e), source=e, lineno=line_number, filename=filename, category=UserWarning)
 
 
-def try_sass_compile(code: str, verbose: bool, **kwargs) -> typing.Optional[str]:
+SCSS_BACKENDS = ("libsass", "dart-sass")
+
+
+def _resolve_scss_backend(backend: str) -> str:
+    if backend not in SCSS_BACKENDS:
+        raise ValueError(f"Unknown scss backend {backend!r}, choose from {SCSS_BACKENDS}")
+
+    if backend == "dart-sass" and not dart_sass.available():
+        warnings.warn("scss backend 'dart-sass' requires `sass-embedded` to be installed, falling back to libsass.")
+        return "libsass"
+
+    return backend
+
+
+def try_sass_compile(code: str, verbose: bool, backend: str = "libsass", **kwargs) -> typing.Optional[str]:
     try:
+        if backend == "dart-sass":
+            return dart_sass.dart_sass_compile(code, **kwargs)
         return sass.compile(string=code, **kwargs)
     except sass.CompileError as e:
         if verbose:
@@ -40,12 +64,18 @@ def try_sass_compile(code: str, verbose: bool, **kwargs) -> typing.Optional[str]
         return None
 
 
+# styles that import other files can't be cached by their own contents (the imported file could change)
+SCSS_IMPORT_RE = re.compile(r"@(import|use|forward)\b")
+
+
 def convert_scss(
     contents: str,
     minify: bool = True,
     path: list[str] = None,
     insert_variables: dict[str, SCSS_TYPES] = None,
     verbose: bool = False,
+    cache: bool = False,
+    backend: str = "libsass",
 ) -> str:
     """
     Convert SCSS to plain CSS, optionally remove newlines and duplicate whitespace
@@ -56,6 +86,8 @@ def convert_scss(
         path: which directory does the file exist in? (for imports)
         insert_variables: Python variables to prefix the contents with
         verbose: print scss/sass compile errors?
+        cache: store the compiled css in .cdn_cache/scss, so unchanged styles don't have to be compiled again?
+        backend: compile with 'libsass' (default) or 'dart-sass' (requires sass-embedded)
 
     Returns: CSS String
     """
@@ -63,41 +95,94 @@ def convert_scss(
     insert_variables = insert_variables or {}
 
     output_style = "compressed" if minify else "nested"
+    backend = _resolve_scss_backend(backend)
+
+    if not cache or SCSS_IMPORT_RE.search(contents):
+        return _convert_scss(contents, path, insert_variables, output_style, verbose, backend)
+
+    compiler_version = dart_sass.dart_sass_version() if backend == "dart-sass" else sass.__version__
+    key = "\0".join(
+        (
+            backend,
+            compiler_version,
+            output_style,
+            repr(path),
+            convert_to_sass_variables(**insert_variables),
+            contents,
+        )
+    )
+    return disk_cache(
+        "scss", key, lambda: _convert_scss(contents, path, insert_variables, output_style, verbose, backend)
+    )
 
-    # first try: scss
-    variables = convert_to_sass_variables(**insert_variables)
 
-    if result := try_sass_compile(variables + contents, verbose, include_paths=path, output_style=output_style):
-        return result
+def _looks_like_scss(contents: str) -> bool:
+    """
+    Cheap syntax sniff: braces or semicolons mean scss, indentation-only code is probably sass.
+    """
+    return "{" in contents or ";" in contents
 
-    # next try: sass
-    variables = convert_to_sass_variables(**insert_variables, _language="sass")
 
-    if result := try_sass_compile(
-        variables + contents, verbose, indented=True, include_paths=path, output_style=output_style
-    ):
-        return result
+def _convert_scss(
+    contents: str,
+    path: list[str],
+    insert_variables: dict[str, SCSS_TYPES],
+    output_style: str,
+    verbose: bool,
+    backend: str = "libsass",
+) -> str:
+    """
+    Try to compile as scss, sass and sass with fixed indentation (in the order the syntax sniff suggests).
+    """
+
+    common_kwargs = dict(include_paths=path, output_style=output_style, backend=backend)
+    sass_variables: list[str] = []  # rendered once, shared by both indented attempts
+
+    def indented_variables() -> str:
+        if not sass_variables:
+            sass_variables.append(convert_to_sass_variables(**insert_variables, _language="sass"))
+        return sass_variables[0]
+
+    def as_scss() -> typing.Optional[str]:
+        variables = convert_to_sass_variables(**insert_variables)
+        return try_sass_compile(variables + contents, verbose, **common_kwargs)
 
-    # last option: sass with fixed indentation:
-    if result := try_sass_compile(
-        variables + textwrap.dedent(contents), verbose, indented=True, include_paths=path, output_style=output_style
-    ):
-        return result
+    def as_sass() -> typing.Optional[str]:
+        return try_sass_compile(indented_variables() + contents, verbose, indented=True, **common_kwargs)
+
+    def as_dedented_sass() -> typing.Optional[str]:
+        # only dedent when the plain sass attempt already failed
+        return try_sass_compile(
+            indented_variables() + textwrap.dedent(contents), verbose, indented=True, **common_kwargs
+        )
+
+    # every failed attempt is a full libsass parse, so start with the most likely syntax:
+    attempts = (
+        (as_scss, as_sass, as_dedented_sass) if _looks_like_scss(contents) else (as_sass, as_dedented_sass, as_scss)
+    )
+    for attempt in attempts:
+        if result := attempt():
+            return result
 
     if verbose:
-        print(f"{variables=}", file=sys.stderr)
+        print(f"{insert_variables=}", file=sys.stderr)
         print(f"{contents=}", file=sys.stderr)
     raise sass.CompileError("Something went wrong with your styles. Are you sure they have valid scss/sass syntax?")
 
 
+LOCAL_CSS_EXTENSIONS = {"css", "scss", "sass"}
+# raw code should start with a comment: // for scss/sass, /* for css too
+INLINE_CSS_PREFIXES = ("//", "/*")
+
+
 def load_css_contents(file: str, cache: bool = True):
     if file.startswith(("http://", "https://")):
         # download
         return extract_contents_cdn(file, cache)
-    elif file.endswith((".css", ".scss", ".sass")):
+    elif file_extension(file) in LOCAL_CSS_EXTENSIONS:
         # read
         return extract_contents_local(file)
-    elif file.startswith("//") or file.startswith("/*"):  # scss and css
+    elif file.startswith(INLINE_CSS_PREFIXES):  # scss and css
         # raw code, should start with comment in CSS to identify it
         return file
     else:
@@ -118,15 +203,22 @@ def replace_placeholders(raw_string: str) -> str:
     return DOTENV_RE.sub(replace, raw_string)
 
 
+@functools.cache
+def _load_dotenv_once() -> bool:
+    # searching and parsing .env for every css block (twice, for global and block variables) adds up:
+    return load_dotenv()
+
+
 def load_variables(source: str | list[str] | dict[str, typing.Any] | None) -> dict[str, typing.Any]:
-    load_dotenv()
+    if source is None:
+        return {}
+
+    _load_dotenv_once()
 
     if isinstance(source, str):
         source = replace_placeholders(source)
     elif isinstance(source, list):
         source = [replace_placeholders(_) for _ in source]
-    elif source is None:
-        return {}
 
     return load_data(source)
 
@@ -139,20 +231,29 @@ def extract_contents_for_css(file: dict | str, settings: dict, cache=True, minif
         data = file
         file = data["file"]
         if block_variables := load_variables(data.get("variables")):
-            variables |= block_variables
+            # merge into a new dict: inline scss_variables are returned as-is by load_data,
+            #  so `|=` would leak these block variables into the settings (and every next file)
+            variables = variables | block_variables
             scss = True
         if scope := data.get("scope"):
             scss = True
 
     contents = load_css_contents(file, cache)
 
-    file = file.split("?")[0].strip()
+    # without query string (e.g. ?v=2), for the extension and include dir only:
+    clean_file = file.split("?", 1)[0].strip()
 
-    if scss or file.endswith((".scss", ".sass")) or file.startswith("//"):
+    if scss or file_extension(clean_file) in {"scss", "sass"} or clean_file.startswith("//"):
         if scope:
             contents = "%s{%s}" % (scope, contents)
         contents = convert_scss(
-            contents, minify=minify, path=[os.path.dirname(file)], insert_variables=variables, verbose=verbose
+            contents,
+            minify=minify,
+            path=[os.path.dirname(clean_file)],
+            insert_variables=variables,
+            verbose=verbose,
+            cache=cache,
+            backend=settings.get("scss_backend", "libsass"),
         )
     elif minify:
         contents = _del_whitespace(contents)
@@ -161,54 +262,84 @@ def extract_contents_for_css(file: dict | str, settings: dict, cache=True, minif
 
 
 ### python to scss
+@functools.lru_cache(maxsize=2048)
 def convert_scss_key(key: str, _level: int = 0) -> str:
+    # the same (nested map) keys are converted over and over, so the result is cached.
+    # note: str.replace is kept over str.translate, which is ~7x slower for this single character swap
     prefix = "" if _level else "$"
     return prefix + key.replace("_", "-")
 
 
 def convert_scss_value(value: SCSS_TYPES, _level: int = 0) -> str:
+    """
+    Convert a Python value to its scss representation (lists and dicts become (nested) lists and maps).
+    """
     _level += 1
 
-    match value:
-        case str():
-            return value.removesuffix(";")  # ; is handled on another level
-        case list():
-            converted = ", ".join(convert_scss_value(_, _level=_level) for _ in value)
-            if _level > 1:
-                # nested - include parens ()
-                converted = f"({converted})"
-            return converted
-        case dict():
-            converted = ", ".join(
-                (
-                    f"{convert_scss_key(key, _level=_level)}: {convert_scss_value(value, _level=_level + 1)}"
-                    for key, value in value.items()
-                )
-            )
-            return f"({converted})"
-        case float():
-            return str(value)
-        case None:
-            return "null"
-        case True:
-            return "true"
-        case False:
-            return "false"
-        # int must come AFTER bool (otherwise True and False are matched)
-        case int():
-            return str(value)
-        case _:
-            raise NotImplementedError(f"Unsupported type {type(value)}")
+    # ordered by how common the type is in scss variables:
+    if isinstance(value, str):
+        return value.removesuffix(";")  # ; is handled on another level
+    elif value is None:
+        return "null"
+    elif value is True:
+        return "true"
+    elif value is False:
+        return "false"
+    # int must come AFTER bool (otherwise True and False are matched)
+    elif isinstance(value, (int, float)):
+        return str(value)
+    elif isinstance(value, dict):
+        converted = ", ".join(
+            f"{convert_scss_key(key, _level=_level)}: {convert_scss_value(sub_value, _level=_level + 1)}"
+            for key, sub_value in value.items()
+        )
+        return f"({converted})"
+    elif isinstance(value, list):
+        converted = ", ".join(convert_scss_value(sub_value, _level=_level) for sub_value in value)
+        if _level > 1:
+            # nested - include parens ()
+            converted = f"({converted})"
+        return converted
+    else:
+        raise NotImplementedError(f"Unsupported type {type(value)}")
+
+
+def _freeze(value: SCSS_TYPES) -> typing.Hashable:
+    """
+    Hashable version of a (nested) variable value, as key for the convert_to_sass_variables cache.
+    The type is included because True == 1 but they convert differently (true vs 1).
+    """
+    if isinstance(value, dict):
+        return dict, tuple((key, _freeze(item)) for key, item in value.items())
+    elif isinstance(value, list):
+        return list, tuple(_freeze(item) for item in value)
+    else:
+        return type(value), value
+
+
+# (language, frozen variables) -> sass code
+_SASS_VARIABLES_CACHE: dict[tuple, str] = {}
 
 
 def convert_to_sass_variables(_language="scss", **variables) -> str:
-    code = ""
+    """
+    Convert Python variables to a block of scss/sass variable declarations.
+    Every css file in a bundle gets the same scss_variables, so the result is cached.
+    """
+    try:
+        key = (_language, _freeze(variables))
+        hash(key)
+    except TypeError:
+        # some unhashable value, just convert it every time
+        return _convert_to_sass_variables(_language, variables)
 
-    eol = ";\n" if _language == "scss" else "\n"
+    if key not in _SASS_VARIABLES_CACHE:
+        _SASS_VARIABLES_CACHE[key] = _convert_to_sass_variables(_language, variables)
+
+    return _SASS_VARIABLES_CACHE[key]
 
-    for key, value in variables.items():
-        key = convert_scss_key(key)
-        value = convert_scss_value(value)
-        code += f"{key}: {value}{eol}"
 
-    return code
+def _convert_to_sass_variables(_language: str, variables: dict[str, SCSS_TYPES]) -> str:
+    eol = ";\n" if _language == "scss" else "\n"
+
+    return "".join(f"{convert_scss_key(key)}: {convert_scss_value(value)}{eol}" for key, value in variables.items())
@@ -0,0 +1,149 @@
+# optional 'dart-sass' scss backend: one long-running Dart Sass compiler, spoken to via the embedded protocol
+# https://github.com/sass/sass/blob/main/spec/embedded-protocol.md
+from __future__ import annotations
+
+import atexit
+import functools
+import io
+import os
+import subprocess
+import threading
+import typing
+
+import sass
+
+try:
+    # pip install edwh-bundler-plugin[dart-sass]
+    from sass_embedded.dart_sass import Release
+    from sass_embedded.protocol.embedded_sass_pb2 import InboundMessage, OutboundMessage, OutputStyle, Syntax
+except ImportError:  # pragma: no cover
+    Release = None
+
+
+def available() -> bool:
+    return Release is not None
+
+
+@functools.cache
+def dart_sass_version() -> str:
+    """
+    Version of the bundled Dart Sass compiler (not of the sass-embedded wrapper).
+    """
+    return Release.init().version
+
+
+def _encode_varint(value: int) -> bytes:
+    data = bytearray()
+    while value > 0x7F:
+        data.append(value & 0x7F | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def _read_varint(stream: typing.BinaryIO) -> int:
+    value = shift = 0
+    while byte := stream.read(1):
+        value |= (byte[0] & 0x7F) << shift
+        if not byte[0] & 0x80:
+            return value
+        shift += 7
+
+    raise EOFError("Dart Sass compiler exited unexpectedly")
+
+
+class DartSassCompiler:
+    """
+    A `sass --embedded` process that compiles every scss file of the bundle(s),
+    so the Dart VM starts (and warms up) only once instead of for every file and every retry.
+    """
+
+    def __init__(self):
+        executable = Release.init().get_executable()
+        self._process = subprocess.Popen(
+            [str(executable.dart_vm_path), str(executable.sass_snapshot_path), "--embedded"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        # requests and responses are not interleaved, so one compilation at a time:
+        self._lock = threading.Lock()
+        self._compilation_id = 0
+
+    def compile(self, code: str, include_paths: list[str], output_style: str, indented: bool = False) -> str:
+        """
+        Same arguments as libsass (except `string`), raises sass.CompileError on invalid code.
+        """
+        message = InboundMessage()
+        request = message.compile_request
+        request.string.source = code
+        request.string.syntax = Syntax.INDENTED if indented else Syntax.SCSS
+        # dart sass has no 'nested' style:
+        request.style = OutputStyle.COMPRESSED if output_style == "compressed" else OutputStyle.EXPANDED
+        for path in include_paths:
+            request.importers.add(path=os.path.abspath(path))
+
+        with self._lock:
+            self._compilation_id += 1
+            response = self._communicate(self._compilation_id, message).compile_response
+
+        if response.WhichOneof("result") == "failure":
+            raise sass.CompileError(response.failure.formatted or response.failure.message)
+
+        # libsass output ends with a newline, dart sass' doesn't:
+        return response.success.css + "\n"
+
+    def _communicate(self, compilation_id: int, message: InboundMessage) -> OutboundMessage:
+        # packet: varint length, varint compilation id, protobuf message
+        payload = _encode_varint(compilation_id) + message.SerializeToString()
+        self._process.stdin.write(_encode_varint(len(payload)) + payload)
+        self._process.stdin.flush()
+
+        while True:
+            packet = io.BytesIO(self._process.stdout.read(_read_varint(self._process.stdout)))
+            response_id = _read_varint(packet)
+            response = OutboundMessage()
+            response.ParseFromString(packet.read())
+
+            match response.WhichOneof("message"):
+                case "error":
+                    raise RuntimeError(f"Dart Sass protocol error: {response.error.message}")
+                case "compile_response" if response_id == compilation_id:
+                    return response
+                # log events (warnings, deprecations) are not shown, like libsass
+
+    def close(self) -> None:
+        if self._process.poll() is None:
+            self._process.stdin.close()
+            self._process.wait(timeout=5)
+
+
+_COMPILER: typing.Optional[DartSassCompiler] = None
+_COMPILER_LOCK = threading.Lock()
+
+
+def dart_sass_compiler() -> DartSassCompiler:
+    global _COMPILER
+    with _COMPILER_LOCK:
+        if _COMPILER is None:
+            _COMPILER = DartSassCompiler()
+            atexit.register(close_dart_sass_compiler)
+
+        return _COMPILER
+
+
+def close_dart_sass_compiler() -> None:
+    global _COMPILER
+    with _COMPILER_LOCK:
+        if _COMPILER is not None:
+            _COMPILER.close()
+            _COMPILER = None
+
+
+def dart_sass_compile(code: str, include_paths: list[str], output_style: str, indented: bool = False) -> str:
+    try:
+        return dart_sass_compiler().compile(code, include_paths, output_style, indented)
+    except (EOFError, BrokenPipeError):
+        # the compiler died, start a new one next time
+        close_dart_sass_compiler()
+        raise
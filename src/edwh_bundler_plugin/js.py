@@ -1,25 +1,52 @@
 # methods for converting JS/TS and hyperscript files
 from __future__ import annotations
 
+import contextlib
+import functools
+import importlib.metadata
+import json
+import re
+import threading
 from pathlib import Path
 from typing import Optional
 
 import dukpy
+from dukpy.tsc import TS_COMPILER, TSC_OPTIONS
 from rjsmin import jsmin
 
 from .shared import (
     DOUBLE_SPACE_RE,
     HS_COMMENT_RE,
     _del_whitespace,
+    disk_cache,
     extract_contents_cdn,
     extract_contents_local,
+    file_extension,
 )
 
+# System.register(["./shared", "./other"], function (exports_1, context_1) { ...
+SYSTEM_REGISTER_RE = re.compile(r"System\.register\(\s*(\[[^\]]*\])")
+
 
 def find_dependencies(ts_compiled: str) -> list[str]:
     """
-    Use dukpy to parse a System.register call in order to extract paths of TS dependencies (e.g. `./shared`).
+    Parse the System.register call in order to extract paths of TS dependencies (e.g. `./shared`).
     """
+    if "System.register(" not in ts_compiled:
+        # no imports or exports, so not a module
+        return []
+
+    if match := SYSTEM_REGISTER_RE.search(ts_compiled):
+        with contextlib.suppress(ValueError):
+            return json.loads(match.group(1))
+
+    # unexpected format, let dukpy evaluate it.
+    # copy, so callers can't modify the cached result:
+    return list(_find_dependencies_dukpy(ts_compiled))
+
+
+@functools.lru_cache(maxsize=256)
+def _find_dependencies_dukpy(ts_compiled: str) -> tuple[str, ...]:
     system_code = """
     const System = {
         register(deps, _) {
@@ -27,17 +54,56 @@ def find_dependencies(ts_compiled: str) -> list[str]:
         }
     };
     """
-    return dukpy.evaljs(f"{system_code};{ts_compiled}")
+    return tuple(dukpy.evaljs(f"{system_code};{ts_compiled}"))
+
+
+@functools.cache
+def _dukpy_version() -> str:
+    return importlib.metadata.version("dukpy")
+
+
+_TS_LOCK = threading.Lock()
+
+
+@functools.cache
+def _typescript_interpreter() -> dukpy.JSInterpreter:
+    """
+    Loading typescriptServices.js takes ~1.5s, so (unlike dukpy.typescript_compile) only do it once per process.
+    """
+    interpreter = dukpy.JSInterpreter()
+    with open(TS_COMPILER) as tsservices_js:
+        interpreter.evaljs(tsservices_js.read())
+    return interpreter
+
+
+def _typescript_compile(typescript_code: str) -> str:
+    # one Duktape heap can't be used from multiple threads (js and css are built concurrently):
+    with _TS_LOCK:
+        return _typescript_interpreter().evaljs(f"ts.transpile(dukpy.tscode, {TSC_OPTIONS});", tscode=typescript_code)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_typescript(typescript_code: str, cache: bool = True) -> str:
+    """
+    dukpy.typescript_compile, but each source is only compiled once: in memory and (with cache) in .cdn_cache/tsc.
+    """
+    if not cache:
+        return _typescript_compile(typescript_code)
+
+    key = f"{_dukpy_version()}\0{typescript_code}"
+    return disk_cache("tsc", key, lambda: _typescript_compile(typescript_code))
 
 
-def extract_contents_typescript(_path: str | Path, settings: dict, name: Optional[str] = None) -> str:
+def extract_contents_typescript(
+    _path: str | Path, settings: dict, name: Optional[str] = None, cache: bool = True
+) -> str:
     """
     Convert typescript to JS (via dukpy) and prepend dependencies.
     """
     path = Path(_path)
     typescript_code = extract_contents_local(path)
 
-    js_code = dukpy.typescript_compile(typescript_code)
+    js_code = compile_typescript(typescript_code, cache)
 
     dependencies = find_dependencies(js_code)
     # System.register([deps] ...
@@ -54,7 +120,7 @@ def extract_contents_typescript(_path: str | Path, settings: dict, name: Optiona
         settings[key] = True
         dep_path = path.parent.joinpath(dep).with_suffix(".ts")
 
-        dep_code = extract_contents_typescript(dep_path, settings, name=dep)
+        dep_code = extract_contents_typescript(dep_path, settings, name=dep, cache=cache)
 
         js_code = dep_code + "\n" + js_code
 
@@ -80,24 +146,31 @@ def include_typescript_system_loader(settings: dict):
     return loader_code
 
 
+LOCAL_JS_EXTENSIONS = {"js", "_hs", "html", "htm"}
+# raw code should start with a comment (or a hyperscript call)
+INLINE_JS_PREFIXES = ("_(", "//", "/*", "_hyperscript(")
+
+
 def extract_contents_for_js(file: str, settings: dict, cache=True, minify=True, verbose=False) -> str:
     """
     Download file from remote if a url is supplied, load from local otherwise.
     If unsupported extension is used, an error will be thrown
     """
 
+    extension = file_extension(file)
+
     if file.startswith(("http://", "https://")):
         # download
         contents = extract_contents_cdn(file, cache)
-    elif file.endswith((".js", "._hs", ".html", ".htm")):
+    elif extension in LOCAL_JS_EXTENSIONS:
         # read
         contents = extract_contents_local(file)
-    elif file.endswith(".ts"):
-        contents = extract_contents_typescript(file, settings)
+    elif extension == "ts":
+        contents = extract_contents_typescript(file, settings, cache=cache)
         if minify:
             contents = jsmin(contents)
 
-    elif file.startswith(("_(", "//", "/*", "_hyperscript(")):
+    elif file.startswith(INLINE_JS_PREFIXES):
         # raw code, should start with comment in JS to identify it
         contents = file
     else:
@@ -105,32 +178,42 @@ def extract_contents_for_js(file: str, settings: dict, cache=True, minify=True,
             f"File type of {file} could not be identified. If you want to add inline code, add a comment at the top of the block."
         )
 
-    file = file.split("?")[0]
+    if "?" in file:
+        # e.g. https://some.cdn/file.js?v=1 - the query is not part of the extension
+        extension = file_extension(file.partition("?")[0])
 
-    if file.endswith("._hs"):
-        if minify:
-            contents = hsmin(contents)
-
-        contents = _include_hyperscript(contents)
-    elif file.endswith(".html"):
-        contents = _append_to_dom(contents)
-    elif file.endswith(".js") and minify:
-        contents = jsmin(contents)
-    elif file.endswith(".css"):
-        if minify:
-            contents = _del_whitespace(contents)
-        contents = _append_to_head(contents)
+    match extension:
+        case "_hs":
+            if minify:
+                contents = hsmin(contents)
+
+            contents = _include_hyperscript(contents)
+        case "html":
+            contents = _append_to_dom(contents)
+        case "js" if minify:
+            contents = jsmin(contents)
+        case "css":
+            if minify:
+                contents = _del_whitespace(contents)
+            contents = _append_to_head(contents)
 
     return contents
 
 
+def _escape_template(contents: str) -> str:
+    """
+    Escape \\ ` $ and { for use in a JS `template string`.
+    """
+    # chained .replace() on purpose: each one is a fast C-level search,
+    #  a single str.translate or re.sub pass with multi-character replacements is ~15x slower
+    return contents.replace("\\", "\\\\").replace("`", "\\`").replace("$", "\\$").replace("{", "\\{")
+
+
 def _include_hyperscript(contents: str) -> str:
     """
     Execute the _hs file with the '_hyperscript' function, escaping some characters
     """
-    contents = contents.replace("\\", "\\\\").replace("`", "\\`").replace("$", "\\$").replace("{", "\\{")
-
-    return f"_hyperscript(`{contents}`)"
+    return f"_hyperscript(`{_escape_template(contents)}`)"
 
 
 def _append_to_dom(html: str) -> str:
@@ -145,8 +228,7 @@ def _append_to_head(css: str) -> str:
     """
     Append some CSS fragment at the end of the head of the page
     """
-    css = css.replace("\\", "\\\\").replace("`", "\\`").replace("$", "\\$").replace("{", "\\{")
-    return f"document.head.innerHTML += `<style>{css}</style>`"
+    return f"document.head.innerHTML += `<style>{_escape_template(css)}</style>`"
 
 
 def hsmin(contents: str) -> str:
@@ -0,0 +1,228 @@
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+
+import pytest
+from invoke import Context
+
+from src.edwh_bundler_plugin import bundler_plugin
+from src.edwh_bundler_plugin.bundler_plugin import (
+    BundleDatabase,
+    _update_assets_sql,
+    _decide_new_version,
+    assert_chmod_777,
+    _fill_variables,
+    _regexify_settings,
+    bundle_css,
+    bundle_js,
+    build,
+    calculate_file_hash,
+    load_bundle,
+    load_config,
+)
+
+EXAMPLE_SRC = Path(__file__).parent.parent / "example_src"
+
+
+def test_load_config_cached_copy(tmp_path):
+    fname = tmp_path / "bundle.yaml"
+    fname.write_text("js:\n  - file.js\nconfig:\n  output-js: bundle.js\n")
+
+    first = load_config(str(fname))
+    assert first == {"_": {"js": ["file.js"], "config": {"output_js": "bundle.js"}}}
+
+    # mutations (e.g. setting 'version') should not leak into the next load:
+    first["_"]["config"]["version"] = "1.0.0"
+    assert "version" not in load_config(str(fname))["_"]["config"]
+
+    # a change to the file invalidates the cache:
+    fname.write_text("js:\n  - other.js\n")
+    assert load_config(str(fname)) == {"_": {"js": ["other.js"]}}
+
+
+def test_load_config_toml_cached(tmp_path):
+    fname = tmp_path / "bundle.toml"
+    fname.write_text('js = ["file.js"]\n[config]\noutput-css = "bundle.css"\n')
+
+    first = load_config(str(fname))
+    first["_"]["config"]["version"] = "1.0.0"
+    assert load_config(str(fname)) == {"_": {"js": ["file.js"], "config": {"output_css": "bundle.css"}}}
+
+
+def test_fill_variables():
+    variables = _regexify_settings({"file": "x", "filename": "bundled", "version": 3})
+
+    assert _fill_variables("static/$filename-$version.js", variables) == "static/bundled-3.js"
+    assert _fill_variables("$file.css", variables) == "x.css"
+    assert _fill_variables("$version", variables) == "3"
+    assert _fill_variables({"output": "$file", "other": "$unknown"}, variables) == {
+        "output": "x",
+        "other": "$unknown",
+    }
+    assert _fill_variables("no variables", _regexify_settings({})) == "no variables"
+    assert _fill_variables(True, variables) is True
+
+
+def test_bundle_js_in_memory(tmp_path):
+    js_file = tmp_path / "file.js"
+    js_file.write_text("console.log(   1   );\n")
+
+    assert bundle_js(["// inline\nconsole.log(2)", str(js_file)], minify=False) == (
+        "/* SOURCE: // inline\nconsole.log(2) */\n"
+        "// inline\nconsole.log(2)\n"
+        f"/* SOURCE: {js_file} */\n"
+        "console.log(   1   );\n\n"
+    )
+
+    output = tmp_path / "bundle.js"
+    bundle_js([str(js_file)], output=str(output))
+    assert output.read_text() == "console.log(1);\n"
+
+
+def test_decide_new_version():
+    previous = {"version": "1.2.3", "major": 1, "minor": 2, "patch": 3}
+
+    assert _decide_new_version(False, False, False, previous, "2") == (2, 0, 0, "2.0.0")
+    assert _decide_new_version(False, False, False, previous, "2.5") == (2, 5, 0, "2.5.0")
+    assert _decide_new_version(True, False, False, previous, None) == (2, 0, 0, "2.0.0")
+    assert _decide_new_version(False, True, False, previous, None) == (1, 3, 0, "1.3.0")
+    assert _decide_new_version(False, False, True, previous, None) == (1, 2, 4, "1.2.4")
+
+    with pytest.raises(ValueError):
+        _decide_new_version(False, False, False, previous, "1.2.3.4")
+
+    with pytest.raises(ValueError):
+        _decide_new_version(True, True, False, previous, None)
+
+
+def test_load_bundle(tmp_path):
+    output = tmp_path / "bundle.css"
+    output.write_text("body{color:red}\n")
+
+    bundle = load_bundle(output)
+    assert bundle.filename == "bundle.css"
+    assert bundle.contents == "body{color:red}\n"
+    assert bundle.hash == hashlib.sha1(b"body{color:red}\n").hexdigest()
+    assert calculate_file_hash(output) == bundle.hash
+
+    output.write_text("")
+    assert load_bundle(output).hash == calculate_file_hash(output) == hashlib.sha1(b"").hexdigest()
+
+
+def test_assert_chmod_777_sudo_fallback(tmp_path, monkeypatch):
+    db = tmp_path / "my assets.db"
+    db.touch(mode=0o644)
+    sql = tmp_path / "x.sql"
+    sql.touch(mode=0o644)
+
+    def chmod(*_):
+        raise PermissionError("owned by another user")
+
+    sudo_commands = []
+
+    class FakeContext:
+        def sudo(self, command):
+            sudo_commands.append(command)
+
+    monkeypatch.setattr(os, "chmod", chmod)
+    monkeypatch.setattr(bundler_plugin.edwh.tasks, "require_sudo", lambda _: True)
+
+    # e.g. the default output_db is a Path:
+    assert_chmod_777(FakeContext(), [db, str(sql)])
+    assert sudo_commands == [f"chmod 777 '{db}'", f"chmod 777 {sql}"]
+
+    sudo_commands.clear()
+    assert_chmod_777(FakeContext(), db)
+    assert sudo_commands == [f"chmod 777 '{db}'"]
+
+
+def test_bundle_parallel(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    js_file = tmp_path / "file.js"
+    js_file.write_text("console.log(   1   );\n")
+    css_file = tmp_path / "style.css"
+    css_file.write_text(".a {\n  color: red;\n}\n")
+
+    js_files = [
+        str(EXAMPLE_SRC / "example.ts"),
+        "// inline\nconsole.log(2)",
+        str(js_file),
+        str(EXAMPLE_SRC / "main2.ts"),
+    ]
+    css_files = [
+        "// inline\n.b { .c { color: $color; } }",
+        str(css_file),
+        {"file": str(css_file), "scope": "#scope", "variables": {"color": "blue"}},
+        {"file": "// inline\n.d { color: $color; }", "variables": {"color": "green"}},
+    ]
+
+    def bundle_all() -> tuple[str, ...]:
+        return tuple(
+            bundle(files, minify=minify, scss_variables={"color": "red"})
+            for bundle, files in ((bundle_js, js_files), (bundle_css, css_files))
+            for minify in (True, False)
+        )
+
+    monkeypatch.delenv("EDWH_BUNDLE_PARALLEL", raising=False)
+    sequential = bundle_all()
+
+    monkeypatch.setenv("EDWH_BUNDLE_PARALLEL", "1")
+    assert bundle_all() == sequential
+
+
+def test_build_concurrent(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "file.js").write_text("console.log(   1   );\n")
+    (tmp_path / "style.scss").write_text(".a { .b { color: $color; } }\n")
+    (tmp_path / "bundle.yaml").write_text(
+        "js:\n"
+        f"  - {EXAMPLE_SRC / 'main2.ts'}\n"
+        "  - file.js\n"
+        "css:\n"
+        "  - style.scss\n"
+        "config:\n"
+        "  minify: 1\n"
+        "  scss-variables:\n"
+        "    color: red\n"
+    )
+
+    def build_to(directory: str, sequential: bool) -> list[str]:
+        # [{config name: output path}] for js, css
+        outputs = build(
+            Context(),
+            output_js=f"{directory}/bundle.js",
+            output_css=f"{directory}/bundle.css",
+            sequential=sequential,
+        )
+        return [Path(path).read_text() for output in outputs for path in output.values()]
+
+    sequential = build_to("sequential", sequential=True)
+    assert len(sequential) == 2
+    assert sequential[1] == ".a .b{color:red}\n\n"
+
+    # js and css side by side should give the same bundles (in the same order):
+    assert build_to("concurrent", sequential=False) == sequential
+
+
+def test_update_assets_sql(tmp_path):
+    db = sqlite3.connect(":memory:", factory=BundleDatabase)
+    db.sql_path = str(tmp_path / "assets.sql")
+    db.row_factory = sqlite3.Row
+    db.executescript(bundler_plugin.create_bundle_version_table())
+    with db:
+        db.execute(
+            "INSERT INTO bundle_version (filetype, version, filename, changelog, contents) VALUES (?, ?, ?, ?, ?)",
+            ("js", "1.0.0", "bundle.js", "it's new", "console.log('hi');\n"),
+        )
+
+    _update_assets_sql(db)
+
+    # the row factory is only swapped out during the dump:
+    assert db.row_factory is sqlite3.Row
+
+    restored = sqlite3.connect(":memory:")
+    restored.executescript((tmp_path / "assets.sql").read_text())
+    assert restored.execute("SELECT filename, changelog, contents FROM bundle_version").fetchall() == [
+        ("bundle.js", "it's new", "console.log('hi');\n")
+    ]
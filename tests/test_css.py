@@ -0,0 +1,38 @@
+import pytest
+import sass
+
+from src.edwh_bundler_plugin import css
+
+
+def test_convert_scss_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    code = "// inline\n.a { color: $color; }"
+
+    first = css.convert_scss(code, insert_variables={"color": "red"}, cache=True)
+    assert first == ".a{color:red}\n"
+
+    # second time comes from .cdn_cache/scss without compiling:
+    monkeypatch.setattr(css, "try_sass_compile", None)
+    assert css.convert_scss(code, insert_variables={"color": "red"}, cache=True) == first
+
+
+def test_convert_scss_backend(monkeypatch):
+    with pytest.raises(ValueError):
+        css.convert_scss(".a { color: red; }", backend="node-sass")
+
+    # without sass-embedded installed, dart-sass falls back to libsass:
+    monkeypatch.setattr(css.dart_sass, "Release", None)
+    with pytest.warns(UserWarning):
+        assert css.convert_scss(".a { color: red; }", backend="dart-sass") == ".a{color:red}\n"
+
+
+def test_convert_scss_dart_sass():
+    pytest.importorskip("sass_embedded")
+
+    code = "// inline\n.a { .b { color: $color; } }"
+    assert css.convert_scss(code, insert_variables={"color": "red"}, backend="dart-sass") == ".a .b{color:red}\n"
+    # the same compiler process handles the next file (and the sass syntax retry):
+    assert css.convert_scss(".a\n  color: red", backend="dart-sass") == ".a{color:red}\n"
+
+    with pytest.raises(sass.CompileError):
+        css.convert_scss(".a {", backend="dart-sass")
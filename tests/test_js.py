@@ -0,0 +1,14 @@
+from src.edwh_bundler_plugin.js import find_dependencies, hsmin
+
+
+def test_hsmin():
+    code = "-- toggle\non click\n  toggle .red on me  -- comment\n  go to url https://example.com\n"
+
+    assert hsmin(code) == " on click toggle .red on me go to url https://example.com "
+
+
+def test_find_dependencies():
+    compiled = 'System.register(["./shared", "./x/y"], function (exports_1, context_1) {\n    "use strict";\n'
+
+    assert find_dependencies(compiled) == ["./shared", "./x/y"]
+    assert find_dependencies("console.log(1);\n") == []
@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+import requests
+
+from src.edwh_bundler_plugin import shared
+
+
+def test_prefetch_cdn(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    downloaded = []
+    lock = threading.Lock()
+
+    def fake_download(url: str) -> str:
+        with lock:
+            downloaded.append(url)
+        return f"/* {url} */"
+
+    monkeypatch.setattr(shared, "_extract_contents_cdn", fake_download)
+
+    urls = ["https://cdn.example/a.js", "https://cdn.example/b.css", "local.js", "https://cdn.example/a.js"]
+    shared.prefetch_cdn(urls)
+    assert sorted(downloaded) == ["https://cdn.example/a.js", "https://cdn.example/b.css"]
+
+    # afterwards, the files come from the cache:
+    assert shared.extract_contents_cdn("https://cdn.example/b.css") == "/* https://cdn.example/b.css */"
+    assert len(downloaded) == 2
+
+
+def test_prefetch_cdn_error(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    downloaded = []
+    lock = threading.Lock()
+
+    def fake_download(url: str) -> str:
+        with lock:
+            downloaded.append(url)
+        if "broken" in url:
+            raise requests.Timeout(url)
+        return f"/* {url} */"
+
+    monkeypatch.setattr(shared, "_extract_contents_cdn", fake_download)
+
+    urls = ["https://cdn.example/a.js", "https://cdn.example/broken.js", "https://cdn.example/c.js"]
+    with pytest.raises(requests.Timeout, match="broken"):
+        shared.prefetch_cdn(urls, max_workers=1)
+
+    # the failing url is only tried once:
+    assert downloaded.count("https://cdn.example/broken.js") == 1